@@ -10,16 +10,87 @@ __license__ = "MIT"
 
 
 import cv2
+import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, Frame
 import os
 import ffmpeg
-import copy
 import subprocess
 import pickle
 import csv
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from PIL import Image, ImageTk
 
+logger = logging.getLogger(__name__)
+
+# Buffer size of pipes from FFmpeg processes and of exported files
+PIPE_BUFFER_SIZE = 1 << 20
+
+# Identifies exported settings files
+SETTINGS_FORMAT = "videoCropROIs/settings-v1"
+
+# Video encoders in order of preference, with options for a quality similar to libx264 with crf 22
+VIDEO_ENCODERS = {
+    "h264_nvenc": ['-preset', 'p5', '-cq', '22'],                   # NVIDIA
+    "h264_qsv": ['-global_quality', '22'],                          # Intel
+    "h264_amf": ['-rc', 'cqp', '-qp_i', '22', '-qp_p', '22'],       # AMD
+    "hevc_videotoolbox": ['-q:v', '65', '-tag:v', 'hvc1'],          # macOS
+    "libx264": ['-crf', '22']                   # quality: 22 ~ standard quality
+}
+SOFTWARE_ENCODER = "libx264"
+
+# ROI files of a single video, .npz and .pkl are files of older versions
+ROI_FILE_TYPES = [("ROIs", ["*.npy", "*.npz", "*.pkl"])]
+
+# Record of a ROI in ROI files, little endian so that files can be exchanged between machines
+ROI_DTYPE = np.dtype([("x1", "<i4"), ("y1", "<i4"), ("x2", "<i4"), ("y2", "<i4")])
+
+# Frame of the video that is shown for drawing ROIs
+PREVIEW_FRAME = 60
+
+# Share of the frame, above which the ROI overlays are cleaned by copying the whole frame
+DIRTY_AREA_FULL_COPY = 0.6
+
+# Distance in pixels in which the edges (HANDLE_RADIUS) and corners (HANDLE_CORNER_RADIUS) of a ROI can be grabbed
+HANDLE_RADIUS = 10
+HANDLE_CORNER_RADIUS = 2 * HANDLE_RADIUS
+
+# Cell size in pixels of the SpatialHash that finds the ROIs near the mouse
+SPATIAL_HASH_CELL = 64
+
+# Regions of a ROI as classified by hit_test_rois, in the order in which they are tested
+ROI_REGIONS = ("none", "top_left", "top_right", "bottom_left", "bottom_right", "top", "bottom", "left", "right", "inside")
+ROI_INSIDE = ROI_REGIONS.index("inside")
+
+# Mouse cursor per region
+ROI_CURSORS = ("", "top_left_corner", "top_right_corner", "bottom_left_corner", "bottom_right_corner",
+               "top_side", "bottom_side", "left_side", "right_side", "fleur")
+
+# Coordinates (left, top, right, bottom) that are moved, when resizing a ROI at a region
+ROI_RESIZE_SIDES = {
+    "top_left": (1, 1, 0, 0),
+    "top_right": (0, 1, 1, 0),
+    "bottom_left": (1, 0, 0, 1),
+    "bottom_right": (0, 0, 1, 1),
+    "top": (0, 1, 0, 0),
+    "bottom": (0, 0, 0, 1),
+    "left": (1, 0, 0, 0),
+    "right": (0, 0, 1, 0)
+}
+
+# Threads of the decoder and of every encoder in the FFmpeg processes used for cropping.
+# One process per video, they run side by side as long as their threads (see ffmpeg_thread_count)
+# together do not exceed CPU_THREADS, a video that needs more runs alone.
+FFMPEG_THREADS = 2
+CPU_THREADS = os.cpu_count() or FFMPEG_THREADS
+CROP_WORKERS = max(1, CPU_THREADS // FFMPEG_THREADS)
+
 
 class Roi:
     """
@@ -29,26 +100,40 @@ class Roi:
     """
     def __init__(self):
         # initialization of a new class
-        self.coordinates = [
-            [0, 0],  # top left corner
-            [0, 0]   # bottom right corner
-        ]
+        self.coordinates = np.zeros((2, 2), dtype=np.int32)     # rows: top left corner, bottom right corner
         self.height = 0     # height of Roi
         self.width = 0      # width of Roi
         self.status = False     # is True, if Roi is new and not yet saved to Roi list
 
+    def __setstate__(self, state):
+        # ROIs pickled by older versions store their coordinates as nested lists
+        self.__dict__.update(state)
+        self.coordinates = np.array(self.coordinates, dtype=np.int32).reshape(2, 2)
+        self.calculateDimensions()
+
+    @classmethod
+    def fromArray(cls, coordinates):
+        # fast alternative constructor, uses the given (2, 2) int32 array without copying it
+        roi = cls.__new__(cls)
+        roi.coordinates = coordinates
+        roi.status = False
+        roi.calculateDimensions()
+        return roi
+
     def reset(self):
-        self.coordinates = [[0, 0], [0, 0]]
+        self.coordinates[:] = 0
+        self.calculateDimensions()
         self.setStatus(False)
 
     def setCoordinates(self, i, x, y, sort=True):
-        self.coordinates[i] = [x, y]
+        self.coordinates[i] = (x, y)
         if sort:
             self.sortCoordinates()
         self.calculateDimensions()
 
     def setRoi(self, a, b):
-        self.coordinates = [a, b]
+        self.coordinates[0] = a
+        self.coordinates[1] = b
         self.sortCoordinates()
         self.calculateDimensions()
 
@@ -59,17 +144,17 @@ class Roi:
         return self.width
 
     def getCoordinates(self, i):
+        # returns a view, use tolist() where plain ints are needed
         return self.coordinates[i]
 
     def sortCoordinates(self):
-        self.coordinates = [
-            [min(self.coordinates[0][0], self.coordinates[1][0]), min(self.coordinates[0][1], self.coordinates[1][1])],
-            [max(self.coordinates[0][0], self.coordinates[1][0]), max(self.coordinates[0][1], self.coordinates[1][1])]
-        ]
+        # sorting each column puts the minimum in the top left and the maximum in the bottom right corner
+        self.coordinates.sort(axis=0)
 
     def calculateDimensions(self):
-        self.width = self.getCoordinates(1)[0] - self.getCoordinates(0)[0]
-        self.height = self.getCoordinates(1)[1] - self.getCoordinates(0)[1]
+        # bbox holds the corners (x1, y1, x2, y2) as plain ints for the event handlers
+        self.bbox = x1, y1, x2, y2 = tuple(self.coordinates.ravel().tolist())
+        self.width, self.height = x2 - x1, y2 - y1
 
     def setStatus(self, status):
         self.status = status
@@ -78,10 +163,141 @@ class Roi:
         return self.status
 
 
+@dataclass
+class VideoEntry:
+    """
+    A video in the file list of the GUI, stored by the id of its row in the Treeview
+    """
+    path: str
+    rois: list = field(default_factory=list)
+    status: str = "Not labeled"
+
+
+class RoiStore:
+    """
+    Corners of all ROIs of a RoiWindow in one contiguous array (structure of arrays instead of Roi objects).
+    xy has one row [x1, y1, x2, y2] per ROI, with the top left corner first.
+    """
+    def __init__(self, capacity=16):
+        self.buffer = np.zeros((capacity, 4), dtype=np.int32)
+        self.n = 0
+
+    @classmethod
+    def fromRois(cls, rois):
+        store = cls(max(16, len(rois)))
+        store.extend(rois)
+        return store
+
+    @property
+    def xy(self):
+        # view on the rows in use
+        return self.buffer[:self.n]
+
+    def __len__(self):
+        return self.n
+
+    def reserve(self, n):
+        if n > len(self.buffer):
+            buffer = np.zeros((max(n, 2 * len(self.buffer)), 4), dtype=np.int32)
+            buffer[:self.n] = self.xy
+            self.buffer = buffer
+
+    def append(self, bbox):
+        self.reserve(self.n + 1)
+        self.n += 1
+        self.set(self.n - 1, bbox)
+
+    def extend(self, rois):
+        self.extendArray(rois_to_array(rois))
+
+    def extendArray(self, xy):
+        # appends the rows [x1, y1, x2, y2] of xy, with the corners sorted like in set
+        self.reserve(self.n + len(xy))
+        rows = self.buffer[self.n:self.n + len(xy)]
+        rows[:, :2] = np.minimum(xy[:, :2], xy[:, 2:])
+        rows[:, 2:] = np.maximum(xy[:, :2], xy[:, 2:])
+        self.n += len(xy)
+
+    def pop(self, i=-1):
+        bbox = self.get(i)
+        self.delete([i])
+        return bbox
+
+    def get(self, i):
+        return tuple(self.xy[i].tolist())
+
+    def set(self, i, bbox):
+        # like Roi.setRoi the corners are sorted, so that x1 <= x2 and y1 <= y2
+        x1, y1, x2, y2 = bbox
+        self.xy[i] = min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+    def delete(self, indices):
+        # the remaining rows are compacted with a mask in one pass, O(N) for any number of indices
+        # indices that do not exist (any more) are ignored
+        keep = np.ones(self.n, dtype=bool)
+        keep[[idx for idx in indices if -self.n <= idx < self.n]] = False
+        n = int(np.count_nonzero(keep))
+        self.buffer[:n] = self.xy[keep]
+        self.n = n
+
+    def clear(self):
+        self.n = 0
+
+    def toRois(self):
+        # Roi objects for the GUI
+        return rois_from_array(self.xy)
+
+
+class SpatialHash:
+    """
+    Uniform grid over the frame to find the ROIs near a mouse position without testing all of them.
+    Every ROI is registered in all cells that its bounds, grown by the corner distance HANDLE_CORNER_RADIUS, overlap.
+    """
+    def __init__(self, cellSize=SPATIAL_HASH_CELL):
+        self.cellSize = cellSize
+        self.cells = {}         # (column, row) -> set of ROI indices
+        self.cellsOfRoi = {}    # ROI index -> list of (column, row)
+
+    def rebuild(self, bounds):
+        self.cells.clear()
+        self.cellsOfRoi.clear()
+        for idx, (x1, y1, x2, y2) in enumerate(bounds.tolist()):
+            self.insert(idx, x1, y1, x2, y2)
+
+    def insert(self, idx, x1, y1, x2, y2):
+        margin = HANDLE_CORNER_RADIUS
+        size = self.cellSize
+        keys = [
+            (column, row)
+            for column in range((min(x1, x2) - margin) // size, (max(x1, x2) + margin) // size + 1)
+            for row in range((min(y1, y2) - margin) // size, (max(y1, y2) + margin) // size + 1)
+        ]
+        for key in keys:
+            self.cells.setdefault(key, set()).add(idx)
+        self.cellsOfRoi[idx] = keys
+
+    def remove(self, idx):
+        for key in self.cellsOfRoi.pop(idx, ()):
+            cell = self.cells[key]
+            cell.discard(idx)
+            if not cell:
+                del self.cells[key]
+
+    def update(self, idx, x1, y1, x2, y2):
+        self.remove(idx)
+        self.insert(idx, x1, y1, x2, y2)
+
+    def query(self, x, y):
+        # indices of the ROIs that may be hit at (x, y), in ascending order
+        cell = self.cells.get((x // self.cellSize, y // self.cellSize), ())
+        return np.array(sorted(cell), dtype=np.intp)
+
+
 class VideoCropperGUI:
     def __init__(self, master, params=None):
         if params:
             self.ffmpeg_executable = params["ffmpeg_executable"]
+            self.ffprobe_executable = params.get("ffprobe_executable", get_ffprobe_executable(self.ffmpeg_executable))
         self.master = master
         self.master.title("Crop videos")  # title
 
@@ -94,20 +310,28 @@ class VideoCropperGUI:
         self.working_video_path = ""
         self.working_roi_list = []
         self.roi = []
-        self.roi_dict = {}                  # Create a dictionary to store ROIs for each video
+        self.entries = {}                   # VideoEntry (path, ROIs and status) per Treeview row id
 
         # Output-related variables
         self.output_folder = ""
 
+        # Encoder for the cropped videos, hardware encoders are preferred if available
+        self.encoder_var = tk.StringVar(value=SOFTWARE_ENCODER)
+
         self.initGUI()
         self.roiWindow = None
 
-        self.check_ffmpeg()
+        if self.check_ffmpeg():
+            self.detect_encoder()
 
         self.videoListByPath = {}
 
         self.progress_window = None
         self.status_bar = None
+        self.crop_queue = None
+        self.crop_start_time = 0
+        self.progress_label = None
+        self.video_info = {}                # ffprobe results per video path
 
     def initGUI(self):
         # ==================== GUI =================================
@@ -209,6 +433,11 @@ class VideoCropperGUI:
         menuFilter.add_separator()
         menuFilter.add_command(label="Convert to black and white", command=lambda: self.filterAdd("hue=s=0"))
         menuFilter.add_command(label="Increase contrast and brightness", command=lambda: self.filterAdd("eq=contrast=2:brightness=0.8"))
+        menuFilter.add_separator()
+
+        # encoders are added by detect_encoder
+        self.menuEncoder = tk.Menu(menuFilter, tearoff=0)
+        menuFilter.add_cascade(label="Encoder", menu=self.menuEncoder)
 
         menubar.add_cascade(label="Filter", menu=menuFilter)
 
@@ -272,6 +501,66 @@ class VideoCropperGUI:
             self.show_error_message("FFmpeg Error", f"ffmpeg is not installed correctly. "
                                     f"Please make sure to adjust 'ffmpeg_executable' ({self.ffmpeg_executable})")
 
+    def detect_encoder(self):
+        # the test encodes run in a background thread, until they are done SOFTWARE_ENCODER is used
+        encoder_queue = queue.Queue()
+
+        def worker():
+            try:
+                encoder_queue.put(detect_encoders(self.ffmpeg_executable))
+            except Exception:
+                encoder_queue.put([SOFTWARE_ENCODER])
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.master.after(50, self.drain_encoder_queue, encoder_queue)
+
+    def drain_encoder_queue(self, encoder_queue):
+        # selects the first usable encoder of VIDEO_ENCODERS, the others can be chosen in the menu
+        try:
+            encoders = encoder_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(50, self.drain_encoder_queue, encoder_queue)
+            return
+        for encoder in encoders:
+            self.menuEncoder.add_radiobutton(label=encoder, value=encoder, variable=self.encoder_var)
+        self.encoder_var.set(encoders[0])
+
+    @property
+    def roi_dict(self):
+        # ROIs for each video
+        return {entry.path: entry.rois for entry in self.entries.values()}
+
+    def add_video(self, file_path, rois=None):
+        # adds a video to the file list, or updates its ROIs if it is already in the list
+        key = self.videoListByPath.get(file_path)
+        if key is None:
+            key = self.tree.insert("", tk.END, values=(file_path, 0, "Not labeled"))
+            self.videoListByPath[file_path] = key
+            self.entries[key] = VideoEntry(file_path)
+        if rois is not None:
+            self.set_rois(key, rois)
+        return key
+
+    def set_rois(self, key, rois, status="Labeled"):
+        entry = self.entries[key]
+        # only changed cells are updated in the Treeview
+        if len(rois) != len(entry.rois):
+            self.tree.set(key, 'ROIs', len(rois))
+        if status != entry.status:
+            self.tree.set(key, 'Status', status)
+        entry.rois = rois
+        entry.status = status
+
+    def get_working_video(self):
+        # the selected video becomes the working video, without selection the last one is used again
+        selected_item = self.tree.selection()
+        if selected_item:
+            self.working_video_path = self.entries[selected_item[0]].path
+        key = self.videoListByPath.get(self.working_video_path)
+        if key is None:
+            self.show_error_message("No Video selected", f"Error: No video selected. Please select a video.")
+        return key
+
     def select_video(self):
         file_path = filedialog.askopenfilename(filetypes=[("MP4", ["*.mp4", "*.MP4"])])
 
@@ -283,47 +572,36 @@ class VideoCropperGUI:
             return
         else:
             # add to file list
-            key = self.tree.insert("", tk.END, values=(file_path, 0, "Not labeled"))
-            self.videoListByPath[file_path] = key
+            self.add_video(file_path)
             # self.tree.selection_clear()         # clear selection
             # self.tree.selection_set(tk.END)                   # select the new added file
 
-        # Clear existing ROIs for the selected video
         self.roi = []
-        self.roi_dict[file_path] = []
 
     def remove_selected_file(self):
         selected_item = self.tree.selection()
         if selected_item:
-            item_values = self.tree.item(selected_item[0], 'values')
-            video_path = item_values[0]
+            entry = self.entries.pop(selected_item[0])      # remove roi data
+            self.videoListByPath.pop(entry.path)
             self.tree.delete(selected_item[0])
-            if video_path in self.roi_dict:
-                self.roi_dict.pop(video_path)           # remove roi data
         else:
             self.show_error_message("No Video selected", f"Error: Please select a video.")
 
     def drawRoi(self):
         # information on selected video
-        selected_item = self.tree.selection()
-        if selected_item:
-            item_values = self.tree.item(selected_item[0], 'values')
-            self.working_video_path = item_values[0]
-        if not self.working_video_path:
-            self.show_error_message("No Video selected", f"Error: No video selected. Please select a video.")
+        key = self.get_working_video()
+        if key is None:
             return
 
         # Callback Function to save new rois:
         def saveNewRois(rois):
-            self.roi_dict[self.working_video_path] = rois
-
             # Spalten Anzeige aktualisieren
-            key = self.videoListByPath.get(self.working_video_path)
-            if key:
-                self.tree.item(key, values=(self.working_video_path, len(rois), "Labeled"))
+            if key in self.entries:
+                self.set_rois(key, rois)
 
-        self.roiWindow = RoiWindow(self.master, self.roi_dict[self.working_video_path], saveCallback=saveNewRois)
-        self.roiWindow.loadVideo(self.working_video_path)
+        self.roiWindow = RoiWindow(self.master, self.entries[key].rois, saveCallback=saveNewRois,
+                                   ffmpegExecutable=self.ffmpeg_executable)
+        self.roiWindow.loadVideo(self.working_video_path, self.get_video_info(self.working_video_path))
 
     def select_output_folder(self):
         path_components = get_path_components(self.working_video_path)
@@ -337,7 +615,7 @@ class VideoCropperGUI:
             self.show_error_message("Input Video Not Selected", "Please select an input video.")
             return
 
-        if len(self.roi_dict) < 1:
+        if len(self.entries) < 1:
             self.show_error_message("No ROIs selected", "Please draw at least one region of interest.")
             return
 
@@ -346,32 +624,42 @@ class VideoCropperGUI:
             self.show_error_message("No output folder selected", "Please select an output folder.")
             return
 
+        jobs = self.enqueue_crops()
+        if jobs is None:
+            return
+
         self.status_var.set(0)  # Reset the progress bar
         self.showProgressBar()
-        total_crops = sum(len(liste) for liste in self.roi_dict.values())
+        self.crop_start_time = time.monotonic()
 
-        rendered_video = 0
+        # FFmpeg runs in a background thread, the main loop only receives its progress
+        self.crop_queue = queue.Queue()
+        threading.Thread(target=self.crop_worker, args=(jobs, self.encoder_var.get(), self.crop_queue), daemon=True).start()
+        self.master.after(50, self.drain_crop_queue)
 
+    def enqueue_crops(self):
+        # collects one job (input_path, [(output_path, filter), ...]) per video, the jobs are rendered in parallel
+        # filter is None if the ROI covers the whole frame without filter, these outputs are only copied
+        jobs = []
         for video_path, roi_list_per_video in self.roi_dict.items():
             if not roi_list_per_video:
                 continue
 
-            cap = cv2.VideoCapture(video_path)
-            ret, frame = cap.read()
-
+            info = self.get_video_info(video_path)
+            outputs = []
             i = 0
             for roi_list in roi_list_per_video:
-                start_time = 0
                 i += 1
 
                 # Cropping Filter
-                x1, y1 = roi_list.getCoordinates(0)
-                x2, y2 = roi_list.getCoordinates(1)
+                x1, y1, x2, y2 = roi_list.bbox
                 filter = 'crop={}:{}:{}:{}'.format(x2 - x1, y2 - y1, x1, y1)
 
                 # If black and white Checkbox is ticked:
                 if self.boleanFilter.get() == 1:
-                    filter += f", {self.textFilter.get("1.0", tk.END)}"
+                    filter += f", {self.textFilter.get('1.0', tk.END).strip()}"
+                elif info and x1 == 0 and y1 == 0 and (x2, y2) == (info["width"], info["height"]):
+                    filter = None
 
                 output_filename = f"{os.path.splitext(os.path.basename(video_path))[0]}_{i}_cropped.mp4"
                 subfolder = os.path.join(self.output_folder, os.path.splitext(os.path.basename(video_path))[0])
@@ -380,107 +668,154 @@ class VideoCropperGUI:
                         os.makedirs(subfolder)
                     except Exception as e:
                         self.show_error_message("Error Creating Directory", f"Error: {e}")
-                        return
+                        return None
                 output_path = os.path.join(subfolder, output_filename)
-
+                outputs.append((output_path, filter))
+
+            jobs.append((video_path, outputs))
+        return jobs
+
+    def crop_worker(self, jobs, encoder, queue_out):
+        # runs in a background thread: no tkinter calls in here, everything goes through queue_out
+        # the work of a job is its number of frames times its number of outputs
+        infos = [self.get_video_info(video_path) for video_path, _ in jobs]
+        weights = [max(info["frames"] if info else 0, 1) * len(outputs) for info, (_, outputs) in zip(infos, jobs)]
+        done = [0.0] * len(jobs)
+        lock = threading.Lock()
+
+        def report(index, fraction):
+            with lock:
+                done[index] = fraction
+                progress = sum(d * w for d, w in zip(done, weights)) / sum(weights)
+            queue_out.put(("progress", progress * 100))
+
+        # the processes together may use CPU_THREADS threads, each one waits until enough are free
+        freeThreads = [CPU_THREADS]
+        threadBudget = threading.Condition()
+
+        def run(index, video_path, outputs, info):
+            needed = min(ffmpeg_thread_count(outputs), CPU_THREADS)
+            with threadBudget:
+                threadBudget.wait_for(lambda: freeThreads[0] >= needed)
+                freeThreads[0] -= needed
+            try:
+                run_ffmpeg_crops(self.ffmpeg_executable, video_path, outputs, info,
+                                 lambda fraction: report(index, fraction), encoder)
+            finally:
+                with threadBudget:
+                    freeThreads[0] += needed
+                    threadBudget.notify_all()
+
+        # every video is decoded by an independent FFmpeg process, so they can run side by side
+        with ThreadPoolExecutor(max_workers=CROP_WORKERS) as executor:
+            futures = {
+                executor.submit(run, index, video_path, outputs, info): index
+                for index, ((video_path, outputs), info) in enumerate(zip(jobs, infos))
+            }
+            for future in as_completed(futures):
                 try:
-                    ffmpeg.input(video_path, ss=start_time).output(
-                        output_path,
-                        vcodec='libx264',
-                        crf=22,                 # quality: 22 ~ standard quality
-                        vf=filter,
-                        # t = duration
-                    ).run(overwrite_output=True, cmd=self.ffmpeg_executable)
-                    rendered_video += 1
-                    # update status bar
-                    progress_percent = (rendered_video / total_crops) * 100
-                    self.status_var.set(progress_percent)
-                    if self.status_bar:
-                        self.status_bar.update()
+                    future.result()
+                    report(futures[future], 1.0)
                 except Exception as e:
-                    self.show_error_message("An error occurred:", f"{e} \nPlease make sure that ffmpeg is installed correctly and that the variable ffmpeg_executable contains the correct path to the file.")
+                    queue_out.put(("error", str(e)))
+        queue_out.put(("done",))
 
-            cap.release()
+    def get_video_info(self, video_path):
+        # probes each video only once, returns None if ffprobe fails
+        if video_path not in self.video_info:
+            try:
+                self.video_info[video_path] = probe_video(self.ffprobe_executable, video_path)
+            except Exception:
+                self.video_info[video_path] = None
+        return self.video_info[video_path]
+
+    def drain_crop_queue(self):
+        # runs in the main loop and applies the messages of crop_worker
+        while True:
+            try:
+                message = self.crop_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if message[0] == "progress":
+                # update status bar
+                self.status_var.set(message[1])
+                if self.progress_window and self.progress_window.winfo_exists():
+                    self.progress_label.config(text=format_progress(message[1], time.monotonic() - self.crop_start_time))
+                    self.status_bar.update_idletasks()
+            elif message[0] == "error":
+                self.show_error_message("An error occurred:", f"{message[1]} \nPlease make sure that ffmpeg is installed correctly and that the variable ffmpeg_executable contains the correct path to the file.")
+            elif message[0] == "done":
+                # Progress abgeschlossen, Fenster schließen und Hauptfenster aktivieren
+                self.master.attributes("-disabled", False)
+                if self.progress_window and self.progress_window.winfo_exists():
+                    self.progress_window.destroy()
+                self.progress_window = None
+                return
 
-        if self.progress_window:
-            # Progress abgeschlossen, Fenster schließen und Hauptfenster aktivieren
-            self.master.attributes("-disabled", False)
-            self.progress_window.destroy()
+        self.master.after(50, self.drain_crop_queue)
 
     def show_error_message(self, title, message):
         messagebox.showerror(title, message)
 
     def export_roi_dict(self):
-        path = filedialog.asksaveasfilename(defaultextension=".pkl", filetypes=[("pickle", ".pkl")], initialfile="export.pkl")
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", ".json")], initialfile="export.json")
         if path:
             with open(path, 'wb') as file:
-                pickle.dump(self.roi_dict, file)
+                file.write(roi_dict_to_json(self.roi_dict))
 
     def export_rois(self):
         path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", ".csv")], initialfile="export.csv")
         if path:
-            with open(path, 'w', newline='') as output_file:
+            # one row per ROI: video path, x1, y1, x2, y2
+            rows = [
+                [entry.path, *roi.bbox]
+                for entry in self.entries.values()
+                for roi in entry.rois
+            ]
+            with open(path, 'w', newline='', buffering=PIPE_BUFFER_SIZE) as output_file:
                 # Create a CSV writer object
                 writer = csv.writer(output_file)
-
-                for vid in self.roi_dict:
-                    # Write rows to the output CSV file
-                    for roi in self.roi_dict[vid]:
-                        row = [vid] + roi.getCoordinates(0) + roi.getCoordinates(1)
-                        writer.writerow(row)
+                writer.writerows(rows)
 
     def import_roi_dict(self):
-        path = filedialog.askopenfilename(defaultextension=".pkl", filetypes=[("pickle", ".pkl")])
+        path = filedialog.askopenfilename(defaultextension=".json", filetypes=[("Settings", ["*.json", "*.pkl"])])
         if path:
             try:
                 with open(path, 'rb') as file:
-                    self.roi_dict = pickle.load(file)
+                    roi_dict = roi_dict_from_json(file.read())
 
-                    for video_path, roi_list_per_video in self.roi_dict.items():
+                    for video_path, roi_list_per_video in roi_dict.items():
                         if not validate_video_path(video_path):
                             self.show_error_message("Video does not exist", f"Error: The importet video {video_path} does not exist.")
                             return
                         else:
                             # add to file list
-                            self.listVideos.insert(tk.END, video_path)
-                            self.listVideos.selection_clear(0, tk.END)  # clear selection
-                            self.listVideos.selection_set(tk.END)  # select the new added file
+                            self.add_video(video_path, roi_list_per_video)
 
             except Exception as e:
                 self.show_error_message("Error Importing settings", f"Error: {e}")
                 return
 
     def export_roi(self):
-        selected_item = self.tree.selection()
-        if selected_item:
-            item_values = self.tree.item(selected_item[0], 'values')
-            self.working_video_path = item_values[0]
-
-        if not self.working_video_path:
-            self.show_error_message("No Video selected", f"Error: No video selected. Please select a video.")
+        key = self.get_working_video()
+        if key is None:
             return
 
-        path = filedialog.asksaveasfilename(defaultextension=".pkl", filetypes=[("pickle", ".pkl")],
-                                            initialfile=f"{get_path_components(self.working_video_path)[0]}.pkl")
+        path = filedialog.asksaveasfilename(defaultextension=".npy", filetypes=[("NumPy", ".npy")],
+                                            initialfile=f"{get_path_components(self.working_video_path)[0]}.npy")
         if path:
-            with open(path, 'wb') as file:
-                pickle.dump(self.roi_dict[self.working_video_path], file)
+            save_roi_array(path, rois_to_array(self.entries[key].rois))
 
     def import_roi(self):
-        selected_item = self.tree.selection()
-        if selected_item:
-            item_values = self.tree.item(selected_item[0], 'values')
-            self.working_video_path = item_values[0]
-
-        if not self.working_video_path:
-            self.show_error_message("No Video selected", f"Error: No video selected. Please select a video.")
+        key = self.get_working_video()
+        if key is None:
             return
 
-        path = filedialog.askopenfilename(defaultextension=".pkl", filetypes=[("pickle", ".pkl")])
+        path = filedialog.askopenfilename(defaultextension=".npy", filetypes=ROI_FILE_TYPES)
         if path:
             try:
-                with open(path, 'rb') as file:
-                    self.roi_dict[self.working_video_path] = pickle.load(file)
+                self.set_rois(key, rois_from_array(load_roi_array(path)))
             except Exception as e:
                 self.show_error_message("Error importing ROIs", f"Error: {e}")
                 return
@@ -490,14 +825,23 @@ class VideoCropperGUI:
 
         self.progress_window = tk.Toplevel(self.master)
         self.progress_window.title("Progress")
+        # the window closes itself when cropping is done
+        self.progress_window.protocol("WM_DELETE_WINDOW", lambda: None)
 
         # Fortschrittsbalken erstellen
         self.status_bar = ttk.Progressbar(self.progress_window, variable=self.status_var, mode="determinate")
         self.status_bar.pack(fill=tk.X, padx=10, pady=10)
 
+        # percentage and remaining time
+        self.progress_label = tk.Label(self.progress_window, text=format_progress(0, 0), width=30)
+        self.progress_label.pack(padx=10, pady=(0, 10))
+
 
 class RoiWindow:
-    def __init__(self, master, roiCoordinates, saveCallback=None):
+    # rendered ROI numbers (white tile with black text), shared by all windows
+    labelTiles = {}
+
+    def __init__(self, master, roiCoordinates, saveCallback=None, ffmpegExecutable=None):
         self.window = tk.Toplevel(master)
         self.windowTitle = "Draw Region Of Interests (ROIs)"
         self.window.title(self.windowTitle)
@@ -519,11 +863,20 @@ class RoiWindow:
         self.menuRoi.add_command(label="Export ROIs to file", command=self.exportRois)
         self.menuRoi.add_command(label="Import ROIS from file", command=self.importRoisFile)
         self.menuRoi.add_command(label="Import ROIS from video list")
-        self.menuRoi.add_command(label="Delete all ROIs", command=lambda: self.deleteRoi(list(range(0, len(self.roiCoordinates)))))
+        self.menuRoi.add_command(label="Delete all ROIs", command=lambda: self.deleteRoi(list(range(0, len(self.roiStore)))))
         self.menubar.add_cascade(label="ROIs", menu=self.menuRoi)
 
         self.window.config(menu=self.menubar)
 
+        # Kontextmenü einer ROI, wird bei jedem Rechtsklick wiederverwendet
+        self.popup = tk.Menu(self.canvas, tearoff=0)
+
+        # Hinzufügen eines "Titels" durch einen Label-artigen Menü-Eintrag
+        self.popup.add_command(state="disabled", font=("Arial", 12, "bold"))
+        self.popup.add_separator()
+        self.popup.add_command(label="Delete ROI")
+        self.popup.add_command(label="Display ROI dimensions")
+
         # Mausklick-Event-Handler binden
         self.canvas.bind("<Button-1>", self.mouseEvent)  # Linksklick drücken
         self.canvas.bind("<ButtonRelease-1>", self.mouseEvent)  # Linksklick loslassen
@@ -542,7 +895,8 @@ class RoiWindow:
         self.window.bind("<Escape>", self.escape)        # Esc
 
         self.defaultCursor = "crosshair"
-        self.canvas.configure(cursor=self.defaultCursor)
+        self.currentCursor = None
+        self.setCursor(self.defaultCursor)
 
         # Abfangen des Schließen-Ereignisses
         self.window.protocol("WM_DELETE_WINDOW", self.close)
@@ -550,36 +904,50 @@ class RoiWindow:
         self.frameClean = None
         self.frameWorking = None
         self.cap = None
-
-        self.roiCoordinates = copy.deepcopy(roiCoordinates)    # deepcopy war nötig, da sonst direkt alle Änderungen gespeichert werden.
+        self.ffmpegExecutable = ffmpegExecutable    # used for the preview frame, OpenCV if None
+
+        # display buffers, allocated by updateCanvas for the size of the video
+        self.rgbBuffer = None
+        self.pilImage = None
+        self.photo = None
+        self.drawnRois = None       # per ROI on frameWorking ((bbox, number, color), area), None: nothing drawn yet
+        self.drawnSelection = []    # selection at the last redraw
+        self.roisChanged = True     # ROIs were changed since the last redraw
+
+        # the store is a copy, changes are only passed on by saveRois
+        self.roiStore = RoiStore.fromRois(roiCoordinates)
         self.newRoi = Roi()
         self.relativeCoordinates = []
+        self.dragSelection = None       # indices of the dragged ROIs as array, set when a drag starts
+        self.dragOffsets = None         # (K, 4) offsets of their corners to the mouse, keeps their size fixed
+        self.roiHash = SpatialHash()    # candidates for the hit tests near the mouse
+        self.updateRoiHash()
 
         # status variables
         self.saved = True           # for exit dialog
         self.dragging = None        # for dragging a roi
         self.resizing = None        # for rezising a roi
+        self.pendingDraw = None     # id of the scheduled redraw
+        self.pendingMotion = None   # latest (x, y) of a left mouse drag, applied with the next redraw
+        self.lastMove = None        # (x, y) of the last motion event, Tk repeats events without movement
 
         self.selection = []
 
         # store callback function
         self.saveCallback = saveCallback  # Store the callback function
 
-    def loadVideo(self, vid_path):
+    def loadVideo(self, vid_path, videoInfo=None):
         try:
-            self.cap = cv2.VideoCapture(vid_path)
-
-            if not self.cap.isOpened():
-                raise ValueError("Fehler beim Öffnen des Videos.")
-
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 60)  # sets cursor to 60th frame
-            ret, self.frameClean = self.cap.read()  # reads frame at cursor
-
-            if not ret:
-                raise ValueError("Fehler beim Lesen des Frames.")
+            # a single frame extracted by FFmpeg is faster than opening the video with OpenCV
+            self.frameClean = None
+            if videoInfo and self.ffmpegExecutable:
+                self.frameClean = self.readFrameFFmpeg(vid_path, videoInfo)
+            if self.frameClean is None:
+                self.frameClean = self.readFrameOpenCV(vid_path)
 
             # copying frame to keep it clean
             self.frameWorking = self.frameClean.copy()
+            self.drawnRois = None
 
             # draw existing rois:
             self.drawAllRois()
@@ -588,61 +956,166 @@ class RoiWindow:
             # Fehlerbehandlung
             messagebox.showerror("Fehler", f"Ein Fehler ist aufgetreten: {e}")
 
+    def readFrameFFmpeg(self, vid_path, videoInfo):
+        # returns None if FFmpeg fails, the preview is read with OpenCV then
+        frame = min(PREVIEW_FRAME, max(videoInfo["frames"] - 1, 0))
+        seconds = frame * videoInfo["duration"] / videoInfo["frames"] if videoInfo["frames"] else 0
+        try:
+            return extract_frame(self.ffmpegExecutable, vid_path, seconds, videoInfo["width"], videoInfo["height"])
+        except Exception:
+            return None
+
+    def readFrameOpenCV(self, vid_path):
+        try:
+            self.cap = cv2.VideoCapture(vid_path)
+
+            if not self.cap.isOpened():
+                raise ValueError("Fehler beim Öffnen des Videos.")
+
+            # grab() only advances, so just the preview frame itself gets converted by retrieve()
+            for _ in range(PREVIEW_FRAME + 1):
+                if not self.cap.grab():
+                    break
+            ret, frame = self.cap.retrieve()
+
+            if not ret:
+                # fall back to seeking
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, PREVIEW_FRAME)  # sets cursor to preview frame
+                ret, frame = self.cap.read()  # reads frame at cursor
+
+            if not ret:
+                raise ValueError("Fehler beim Lesen des Frames.")
+
+            return frame
+
         finally:
             # Sicherstellen, dass das VideoCapture-Objekt geschlossen wird
-            if hasattr(self, 'cap') and self.cap.isOpened():
+            if self.cap is not None and self.cap.isOpened():
                 self.cap.release()
 
     def updateCanvas(self, frame):
-        # Frame in RGB umwandeln
-        frameRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Bild in ein PIL-Format umwandeln, das Tkinter anzeigen kann
-        image = Image.fromarray(frameRGB)
-        photo = ImageTk.PhotoImage(image=image)
-
-        # Bild im Tkinter-Label anzeigen
-        self.canvas.config(image=photo)
-        self.canvas.image = photo
+        # buffer, PIL image and Tk photo are created once per frame size and reused afterwards
+        if self.rgbBuffer is None or self.rgbBuffer.shape[:2] != frame.shape[:2]:
+            height, width = frame.shape[:2]
+            # PIL shares the memory of the buffer only for 4 channel images, so RGBA is used instead of RGB
+            self.rgbBuffer = np.empty((height, width, 4), dtype=np.uint8)
+            self.pilImage = Image.frombuffer("RGBA", (width, height), self.rgbBuffer, "raw", "RGBA", 0, 1)
+            self.photo = ImageTk.PhotoImage(image=self.pilImage)
+
+            # Bild im Tkinter-Label anzeigen
+            self.canvas.config(image=self.photo)
+            self.canvas.image = self.photo
+
+        # Frame in RGB umwandeln, direkt in den Puffer des PIL-Bildes
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self.rgbBuffer)
+        self.photo.paste(self.pilImage)
 
     def drawAllRois(self, params=None):
         if params is None:
             params = []
-        if len(self.selection) > 0:
-            for key in self.selection:
-                params.append({
-                    "key": key,
-                    "rgb": (0, 255, 0)
-                })
-        print(params)
-
-        self.frameWorking = self.frameClean.copy()
-        i = 0
-        for idx, roi in enumerate(self.roiCoordinates):
-            result = [item["rgb"] for item in params if item["key"] == idx]
-            if result:
-                self.drawRoi(roi, i+1, result[0])
-            else:
-                self.drawRoi(roi, i+1, (255, 0, 0))
-            i += 1
-        self.updateCanvas(self.frameWorking)
+        logger.debug("drawAllRois %s", params)
 
-    def drawRoi(self, roi, i, rgb=(255, 0, 0)):
-        cv2.rectangle(self.frameWorking, roi.getCoordinates(0), [x + 20 for x in roi.getCoordinates(0)],
-                      (255, 255, 255), -1)  # white background for text
-        cv2.putText(
-            self.frameWorking,
-            str(i),
-            [roi.getCoordinates(0)[0] + 2, roi.getCoordinates(0)[1] + 20],
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 0, 0),
-            2,
-            cv2.LINE_AA)
-
-        cv2.rectangle(self.frameWorking, roi.getCoordinates(0), roi.getCoordinates(1), rgb, 2)
+        # nothing to do if neither the ROIs nor the selection changed since the last redraw
+        if not params and not self.roisChanged and self.drawnRois is not None \
+                and self.selection == self.drawnSelection:
+            return
+        self.roisChanged = False
+        self.drawnSelection = list(self.selection)
+
+        # colors: given by params, green for selected ROIs, red otherwise
+        colors = {item["key"]: item["rgb"] for item in params}
+        # indices of ROIs that no longer exist are ignored
+        selected = np.zeros(len(self.roiStore), dtype=bool)
+        selected[[idx for idx in self.selection if idx < len(selected)]] = True
+
+        states = [
+            (tuple(bbox), idx + 1, colors.get(idx, (0, 255, 0) if selected[idx] else (255, 0, 0)))
+            for idx, bbox in enumerate(self.roiStore.xy.tolist())
+        ]
+
+        # ROI that is currently drawn with the mouse
+        if self.newRoi.getStatus():
+            states.append((self.newRoi.bbox, len(states) + 1, (0, 255, 0)))
+
+        # only the ROIs that changed (and those overlapping them) are drawn again
+        for idx in self.restoreChangedRois(states):
+            self.drawRoi(*states[idx])
+            self.drawnRois[idx] = (states[idx], self.drawnArea(*states[idx][:2]))
+
+        # the canvas is updated once, after all ROIs are drawn
         self.updateCanvas(self.frameWorking)
 
+    def drawRoi(self, bbox, i, rgb=(255, 0, 0)):
+        # number of the ROI on white background, copied from the tile cache
+        x, y, x2, y2 = bbox
+        tile = self.getLabelTile(i)
+        tileHeight, tileWidth = tile.shape[:2]
+        height, width = self.frameWorking.shape[:2]
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + tileWidth, width), min(y + tileHeight, height)
+        if left < right and top < bottom:
+            self.frameWorking[top:bottom, left:right] = tile[top - y:bottom - y, left - x:right - x]
+
+        cv2.rectangle(self.frameWorking, (x, y), (x2, y2), rgb, 2)
+
+    def drawnArea(self, bbox, i):
+        # area (x1, y1, x2, y2) on the frame covered by drawRoi (frame, label and line width), None if outside
+        x, y, x2, y2 = bbox
+        tileHeight, tileWidth = self.getLabelTile(i).shape[:2]
+        height, width = self.frameClean.shape[:2]
+        x1, y1 = max(min(x, x2) - 2, 0), max(min(y, y2) - 2, 0)
+        x2, y2 = min(max(x, x2, x + tileWidth) + 3, width), min(max(y, y2, y + tileHeight) + 3, height)
+        return (x1, y1, x2, y2) if x1 < x2 and y1 < y2 else None
+
+    @classmethod
+    def getLabelTile(cls, i):
+        # renders the number once, the tile grows with the text width for numbers with several digits
+        tile = cls.labelTiles.get(i)
+        if tile is None:
+            (textWidth, _), _ = cv2.getTextSize(str(i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+            tile = np.full((23, max(21, textWidth + 5), 3), 255, dtype=np.uint8)
+            cv2.putText(tile, str(i), (2, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2, cv2.LINE_AA)
+            cls.labelTiles[i] = tile
+        return tile
+
+    def restoreChangedRois(self, states):
+        """
+        Compares the ROIs to draw (bbox, number, color) with those on frameWorking and cleans the areas of
+        changed and removed ROIs from the clean frame. Returns the indices of the ROIs to draw: the changed
+        ones and all that overlap a cleaned or newly drawn area, so that overlapping ROIs keep their order.
+        """
+        height, width = self.frameClean.shape[:2]
+        drawn = self.drawnRois
+        if drawn is not None:
+            changed = [idx for idx, state in enumerate(states) if idx >= len(drawn) or drawn[idx][0] != state]
+            cleaned = [
+                area for idx, (state, area) in enumerate(drawn)
+                if area is not None and (idx >= len(states) or state != states[idx])
+            ]
+            cleanedArea = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in cleaned)
+        if drawn is None or cleanedArea > DIRTY_AREA_FULL_COPY * width * height:
+            self.frameWorking = self.frameClean.copy()
+            self.drawnRois = [None] * len(states)
+            return range(len(states))
+
+        for x1, y1, x2, y2 in cleaned:
+            self.frameWorking[y1:y2, x1:x2] = self.frameClean[y1:y2, x1:x2]
+        del drawn[len(states):]
+
+        redraw = set(changed)
+        areas = cleaned + [area for area in (self.drawnArea(*states[idx][:2]) for idx in changed) if area]
+        while areas:
+            overlapping = [
+                idx for idx, (_, area) in enumerate(drawn)
+                if idx not in redraw and area is not None and any(
+                    area[0] < x2 and x1 < area[2] and area[1] < y2 and y1 < area[3] for x1, y1, x2, y2 in areas)
+            ]
+            redraw.update(overlapping)
+            areas = [drawn[idx][1] for idx in overlapping]
+
+        drawn.extend([None] * (len(states) - len(drawn)))
+        return sorted(redraw)
+
     def mouseEvent(self, event):
         x = event.x
         y = event.y
@@ -660,72 +1133,48 @@ class RoiWindow:
                 self.saved = False
                 self.leftMouseUp(x, y)
             elif event.num == 3:  # Rechte Maustaste
-                print("rechte taste")
+                logger.debug("right mouse button released at %d, %d", x, y)
         elif event.type == tk.EventType.Motion:
             if event.state == 264:
                 self.leftMouseMove(x, y)
             elif event.state == 1032:
-                print("Nein")
+                logger.debug("motion with right mouse button ignored")
             else:
                 self.mouseMove(x, y)
 
     def leftMouseDown(self, x, y):
-        # Check if any existing rectangle is clicked
-        for idx, roi in enumerate(self.roiCoordinates):
-            (x1, y1), (x2, y2) = roi.getCoordinates(slice(0, 2))
-            radius = 10
-            if x1 - radius * 2 <= x <= x1 + radius * 2 and y1 - radius * 2 <= y <= y1 + radius * 2:
-                # top-left
-                self.resizing = (idx, (1, 1, 0, 0))
-                self.relativeCoordinates = [x1 - x, y1 - y]
-            elif x2 - radius * 2 <= x <= x2 + radius * 2 and y1 - radius * 2 <= y <= y1 + radius * 2:
-                # top-right
-                self.resizing = (idx, (0, 1, 1, 0))
-                self.relativeCoordinates = [x2 - x, y1 - y]
-            elif x1 - radius * 2 <= x <= x1 + radius * 2 and y2 - radius * 2 <= y <= y2 + radius * 2:
-                # bottom-left
-                self.resizing = (idx, (1, 0, 0, 1))
-                self.relativeCoordinates = [x1 - x, y2 - y]
-            elif x2 - radius * 2 <= x <= x2 + radius * 2 and y2 - radius * 2 <= y <= y2 + radius * 2:
-                # bottom-right
-                self.resizing = (idx, (0, 0, 1, 1))
-                self.relativeCoordinates = [x2 - x, y2 - y]
-            elif x1 - radius <= x <= x2 + radius and y1 - radius <= y <= y1 + radius:
-                # top
-                self.resizing = (idx, (0, 1, 0, 0))
-                self.relativeCoordinates = [x, y1 - y]
-            elif x1 - radius <= x <= x2 + radius and y2 - radius <= y <= y2 + radius:
-                # bottom
-                self.resizing = (idx, (0, 0, 0, 1))
-                self.relativeCoordinates = [x, y2 - y]
-            elif x1 - radius <= x <= x1 + radius and y1 - radius <= y <= y2 + radius:
-                # left
-                self.resizing = (idx, (1, 0, 0, 0))
-                self.relativeCoordinates = [x1 - x, y]
-            elif x2 - radius <= x <= x2 + radius and y1 - radius <= y <= y2 + radius:
-                # right
-                self.resizing = (idx, (0, 0, 1, 0))
-                self.relativeCoordinates = [x2 - x, y]
-            elif x1 <= x <= x2 and y1 <= y <= y2:
-                self.dragging = idx
-                # self.relativeCoordinates = [x1 - x, y1 - y]
-        else:
-            self.newRoi.setCoordinates(0, x, y, False)
+        # Check if any existing rectangle is clicked, the last matching ROI wins
+        candidates, regions = self.hitTest(x, y)
+        resizeHits = np.flatnonzero((regions > 0) & (regions < ROI_INSIDE))
+        dragHits = np.flatnonzero(regions == ROI_INSIDE)
+        if resizeHits.size > 0:
+            hit = resizeHits[-1]
+            idx = int(candidates[hit])
+            x1, y1, x2, y2 = self.roiStore.get(idx)
+            sides = ROI_RESIZE_SIDES[ROI_REGIONS[regions[hit]]]
+            self.resizing = (idx, sides)
+            self.relativeCoordinates = [
+                x1 - x if sides[0] else x2 - x if sides[2] else x,
+                y1 - y if sides[1] else y2 - y if sides[3] else y
+            ]
+        elif dragHits.size > 0:
+            self.dragging = int(candidates[dragHits[-1]])
+        self.newRoi.setCoordinates(0, x, y, False)
 
         if self.resizing is not None:
             self.selection = [self.resizing[0]]
         elif self.dragging is not None:
             if self.dragging not in self.selection:
                 self.selection = [self.dragging]
-            self.relativeCoordinates = {}
-            for idx in self.selection:
-                (x1, y1), (x2, y2) = self.roiCoordinates[idx].getCoordinates(slice(0, 2))
-                self.relativeCoordinates[idx] = [x1 - x, y1 - y]
+            # index array and offsets (with the width and height in them) are computed once per drag
+            self.dragSelection = np.asarray(self.selection, dtype=np.intp)
+            self.dragOffsets = (self.roiStore.xy[self.dragSelection] - (x, y, x, y)).astype(np.int32)
 
         else:
             self.resetSelection()
 
     def leftMouseUp(self, x, y):
+        self.applyMotion()
         if self.resizing is not None:
             self.selection.clear()
             self.resizing = None
@@ -733,127 +1182,132 @@ class RoiWindow:
             self.dragging = None
         else:
             self.newRoi.setCoordinates(1, x, y, False)
-            self.roiCoordinates.append(copy.deepcopy(self.newRoi))
+            self.roiStore.append(self.newRoi.bbox)
+            self.updateRoiHash()
             self.newRoi.reset()
             self.selection.clear()
 
         self.drawAllRois()
 
     def leftMouseMove(self, x, y):
+        if (x, y) == self.lastMove:
+            return
+        self.lastMove = (x, y)
+
+        # motion events arrive faster than they can be drawn, only the latest position is applied
+        self.pendingMotion = (x, y)
+        self.scheduleDraw()
+
+    def applyMotion(self):
+        if self.pendingMotion is None:
+            return
+        x, y = self.pendingMotion
+        self.pendingMotion = None
+
         if self.dragging is not None:
             if len(self.selection) > 0:
-                for idx in self.selection:
-                    roi = self.roiCoordinates[idx]
-                    roi.setRoi([
-                        x + self.relativeCoordinates[idx][0],
-                        y + self.relativeCoordinates[idx][1]
-                    ], [
-                        roi.getWidth() + x + self.relativeCoordinates[idx][0],
-                        roi.getHeight() + y + self.relativeCoordinates[idx][1]
-                    ])
+                # all selected ROIs are placed relative to the mouse in one step
+                self.roiStore.xy[self.dragSelection] = self.dragOffsets + (x, y, x, y)
+                self.updateRoiHash(self.selection)
         elif self.resizing is not None:
-            roi = self.roiCoordinates[self.resizing[0]]
-            if self.resizing[1][1] == 1:
+            idx, sides = self.resizing
+            x1, y1, x2, y2 = self.roiStore.get(idx)
+            if sides[1] == 1:
                 # top
-                roi.setCoordinates(0, roi.getCoordinates(0)[0], y + self.relativeCoordinates[1], True)
-            if self.resizing[1][3] == 1:
+                y1 = y + self.relativeCoordinates[1]
+            if sides[3] == 1:
                 # bottom
-                roi.setCoordinates(1, roi.getCoordinates(1)[0], y + self.relativeCoordinates[1], True)
-            if self.resizing[1][0] == 1:
+                y2 = y + self.relativeCoordinates[1]
+            if sides[0] == 1:
                 # left
-                roi.setCoordinates(0, x + self.relativeCoordinates[0], roi.getCoordinates(0)[1], True)
-            if self.resizing[1][2] == 1:
+                x1 = x + self.relativeCoordinates[0]
+            if sides[2] == 1:
                 # right
-                roi.setCoordinates(1, x + self.relativeCoordinates[0], roi.getCoordinates(1)[1], True)
+                x2 = x + self.relativeCoordinates[0]
+            self.roiStore.set(idx, (x1, y1, x2, y2))
+            self.updateRoiHash([idx])
         else:  # when creating a new roi
             self.newRoi.setStatus(True)
             self.newRoi.setCoordinates(1, x, y, False)
+            self.roisChanged = True
+
+    def scheduleDraw(self):
+        # at most one redraw per idle cycle
+        if not self.pendingDraw:
+            self.pendingDraw = self.window.after_idle(self.flushDraw)
 
+    def flushDraw(self):
+        self.pendingDraw = None
+        self.applyMotion()
         self.drawAllRois()
-        if self.newRoi.getStatus():
-            self.drawRoi(self.newRoi, len(self.roiCoordinates) + 1, (0, 255, 0))
+
+    def hitTest(self, x, y):
+        # classifies (x, y) only for the ROIs in the cell of the spatial hash, see hit_test_rois
+        candidates = self.roiHash.query(x, y)
+        return candidates, hit_test_rois(self.roiStore.xy[candidates], x, y)
 
     def mouseMove(self, x, y):
-        hovering = False
-        # changing mouse cursor when hovering
-        for idx, roi in enumerate(self.roiCoordinates):
-            (x1, y1), (x2, y2) = roi.getCoordinates(slice(0, 2))
-            radius = 10
-            if x1 - radius * 2 <= x <= x1 + radius * 2 and y1 - radius * 2 <= y <= y1 + radius * 2:
-                self.canvas.configure(cursor="top_left_corner")
-                hovering = True
-            elif x2 - radius * 2 <= x <= x2 + radius * 2 and y1 - radius * 2 <= y <= y1 + radius * 2:
-                self.canvas.configure(cursor="top_right_corner")
-                hovering = True
-            elif x1 - radius * 2 <= x <= x1 + radius * 2 and y2 - radius * 2 <= y <= y2 + radius * 2:
-                self.canvas.configure(cursor="bottom_left_corner")
-                hovering = True
-            elif x2 - radius * 2 <= x <= x2 + radius * 2 and y2 - radius * 2 <= y <= y2 + radius * 2:
-                self.canvas.configure(cursor="bottom_right_corner")
-                hovering = True
-            elif x1 - radius <= x <= x2 + radius and y1 - radius <= y <= y1 + radius:
-                self.canvas.configure(cursor="top_side")
-                hovering = True
-            elif x1 - radius <= x <= x2 + radius and y2 - radius <= y <= y2 + radius:
-                self.canvas.configure(cursor="bottom_side")
-                hovering = True
-            elif x1 - radius <= x <= x1 + radius and y1 - radius <= y <= y2 + radius:
-                self.canvas.configure(cursor="left_side")
-                hovering = True
-            elif x2 - radius <= x <= x2 + radius and y1 - radius <= y <= y2 + radius:
-                self.canvas.configure(cursor="right_side")
-                hovering = True
-            elif x1 <= x <= x2 and y1 <= y <= y2:
-                self.canvas.configure(cursor="fleur")
-                hovering = True
-
-        if not hovering:
-            self.canvas.configure(cursor=self.defaultCursor)
+        if (x, y) == self.lastMove:
+            return
+        self.lastMove = (x, y)
+
+        # changing mouse cursor when hovering, the last matching ROI wins
+        region, _ = classify_hover(self.roiStore.xy[self.roiHash.query(x, y)], x, y)
+        self.setCursor(ROI_CURSORS[region] if region else self.defaultCursor)
+
+    def setCursor(self, cursor):
+        # configure is a round trip to Tk, so it is only called when the cursor changes
+        if cursor != self.currentCursor:
+            self.canvas.configure(cursor=cursor)
+            self.currentCursor = cursor
+
+    def hitIndices(self, x, y):
+        # indices of all ROIs containing (x, y), in ascending order
+        candidates = self.roiHash.query(x, y)
+        return candidates[contains_point(self.roiStore.xy[candidates], x, y)].tolist()
 
     def rightMouseDown(self, x, y):
-        # Check if any existing rectangle is clicked
-        for idx, roi in enumerate(self.roiCoordinates):
-            (x1, y1), (x2, y2) = roi.getCoordinates(slice(0, 2))
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                # existing Rectangle was clicked
-                self.selection = [idx]
-                self.drawAllRois()
+        # Check if any existing rectangle is clicked, the menu is shown for the topmost (last drawn) ROI
+        hits = self.hitIndices(x, y)
+        if not hits:
+            return
+        idx = hits[-1]
 
-                popup = tk.Menu(self.canvas, tearoff=0)
+        # existing Rectangle was clicked
+        self.selection = [idx]
+        self.drawAllRois()
 
-                # Hinzufügen eines "Titels" durch einen Label-artigen Menü-Eintrag
-                popup.add_command(label=f"ROI #{idx + 1}", state="disabled", font=("Arial", 12, "bold"))
-                popup.add_separator()
-                popup.add_command(label="Delete ROI", command=lambda: self.deleteRoi(idx))
-                popup.add_command(label="Display ROI dimensions", command=lambda: self.editRoi(idx))
+        self.popup.entryconfigure(0, label=f"ROI #{idx + 1}")
+        self.popup.entryconfigure(2, command=lambda: self.deleteRoi(idx))
+        self.popup.entryconfigure(3, command=lambda: self.editRoi(idx))
 
-                # Umrechnung von Canvas-Koordinaten zu Bildschirmkoordinaten
-                canvas_x = self.canvas.winfo_rootx() + x
-                canvas_y = self.canvas.winfo_rooty() + y
+        # Umrechnung von Canvas-Koordinaten zu Bildschirmkoordinaten
+        canvas_x = self.canvas.winfo_rootx() + x
+        canvas_y = self.canvas.winfo_rooty() + y
 
-                # Menü anzeigen
-                try:
-                    popup.tk_popup(canvas_x, canvas_y)
-                finally:
-                    popup.grab_release()
+        # Menü anzeigen
+        try:
+            self.popup.tk_popup(canvas_x, canvas_y)
+        finally:
+            self.popup.grab_release()
 
     def shiftLeftMouseDown(self, x, y):
-        for idx, roi in enumerate(self.roiCoordinates):
-            (x1, y1), (x2, y2) = roi.getCoordinates(slice(0, 2))
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                if idx not in self.selection:
-                    self.selection.append(idx)
-                    self.drawAllRois()
+        # adds all ROIs containing (x, y) to the selection
+        added = [idx for idx in self.hitIndices(x, y) if idx not in self.selection]
+        if added:
+            self.selection.extend(added)
+            self.drawAllRois()
 
     def saveRois(self, params=None):
-        self.saveCallback(self.roiCoordinates)
+        self.saveCallback(self.roiStore.toRois())
         self.saved = True
 
     def deleteRoi(self, key):
         if isinstance(key, int):
-            self.roiCoordinates.pop(key)
+            self.roiStore.pop(key)
         elif isinstance(key, list):
-            self.roiCoordinates = [item for index, item in enumerate(self.roiCoordinates) if index not in key]
+            self.roiStore.delete(key)
+        self.updateRoiHash()
         self.resetSelection()
         self.drawAllRois()
 
@@ -872,16 +1326,13 @@ class RoiWindow:
                 response = messagebox.askyesno("Confirm",
                                                f"Changes have been made:\n{change_message}\nDo you want to save them?")
                 if response:
-                    self.roiCoordinates[roiKey].setCoordinates(
-                        0,
+                    self.roiStore.set(roiKey, (
                         variables["X_1"]["value"].get(),
-                        variables["Y_1"]["value"].get()
-                    )
-                    self.roiCoordinates[roiKey].setCoordinates(
-                        1,
+                        variables["Y_1"]["value"].get(),
                         variables["X_2"]["value"].get(),
                         variables["Y_2"]["value"].get()
-                    )
+                    ))
+                    self.updateRoiHash([roiKey])
                     self.drawAllRois()
                 else:
                     # Änderungen werden verworfen
@@ -902,29 +1353,30 @@ class RoiWindow:
         header_label.grid(row=0, column=0, columnspan=2, pady=10)
 
         # Erstellen der Tabelle mit editierbaren Variablen
+        x1, y1, x2, y2 = self.roiStore.get(roiKey)
         variables = {
             "X_1": {
-                "value": tk.IntVar(value=self.roiCoordinates[roiKey].getCoordinates(0)[0]),
+                "value": tk.IntVar(value=x1),
                 "editable": tk.BooleanVar(value=True)
             },
             "Y_1": {
-                "value": tk.IntVar(value=self.roiCoordinates[roiKey].getCoordinates(0)[1]),
+                "value": tk.IntVar(value=y1),
                 "editable": tk.BooleanVar(value=True)
             },
             "X_2": {
-                "value": tk.IntVar(value=self.roiCoordinates[roiKey].getCoordinates(1)[0]),
+                "value": tk.IntVar(value=x2),
                 "editable": tk.BooleanVar(value=True)
             },
             "Y_2": {
-                "value": tk.IntVar(value=self.roiCoordinates[roiKey].getCoordinates(1)[1]),
+                "value": tk.IntVar(value=y2),
                 "editable": tk.BooleanVar(value=True)
             },
             "Height": {
-                "value": tk.IntVar(value=self.roiCoordinates[roiKey].getHeight()),
+                "value": tk.IntVar(value=y2 - y1),
                 "editable": tk.BooleanVar(value=False)
             },
             "Width": {
-                "value": tk.IntVar(value=self.roiCoordinates[roiKey].getWidth()),
+                "value": tk.IntVar(value=x2 - x1),
                 "editable": tk.BooleanVar(value=False)
             }
         }
@@ -958,36 +1410,37 @@ class RoiWindow:
                 self.destroy()
 
     def destroy(self, params=None):
-        self.cap.release()
+        if self.pendingDraw:
+            self.window.after_cancel(self.pendingDraw)
+        if self.cap is not None:
+            self.cap.release()
         self.window.destroy()
 
     def importRoisFile(self):
-        path = filedialog.askopenfilename(defaultextension=".pkl", filetypes=[("pickle", ".pkl")])
+        path = filedialog.askopenfilename(defaultextension=".npy", filetypes=ROI_FILE_TYPES)
         if path:
             try:
-                with open(path, 'rb') as file:
-                    if len(self.roiCoordinates) > 0:
-                        # at least 1 ROI already exists
-                        option = messagebox.askyesno("Choose Option", "Do you want to replace the existing ROIs?")
-                        if option:
-                            self.roiCoordinates = pickle.load(file)
-                        else:
-                            self.roiCoordinates.extend(pickle.load(file))
-                    else:
-                        self.roiCoordinates = pickle.load(file)
+                xy = load_roi_array(path)
+                if len(self.roiStore) > 0:
+                    # at least 1 ROI already exists
+                    option = messagebox.askyesno("Choose Option", "Do you want to replace the existing ROIs?")
+                    if option:
+                        self.roiStore.clear()
+                        self.resetSelection()
+                self.roiStore.extendArray(xy)
+                self.updateRoiHash()
                 self.drawAllRois()
             except Exception as e:
                 print("Error importing ROIs", f"Error: {e}")
                 return
 
     def exportRois(self):
-        path = filedialog.asksaveasfilename(defaultextension=".pkl", filetypes=[("pickle", ".pkl")], initialfile=f"ROIs.pkl")
+        path = filedialog.asksaveasfilename(defaultextension=".npy", filetypes=[("NumPy", ".npy")], initialfile=f"ROIs.npy")
         if path:
-            with open(path, 'wb') as file:
-                pickle.dump(self.roiCoordinates, file)
+            save_roi_array(path, self.roiStore.xy)
 
     def selectAll(self, event):
-        self.selection = list(range(0, len(self.roiCoordinates)))
+        self.selection = list(range(0, len(self.roiStore)))
         self.drawAllRois()
 
     def delete(self, event):
@@ -999,12 +1452,303 @@ class RoiWindow:
     def resetSelection(self):
         self.selection = []
 
+    def updateRoiHash(self, indices=None):
+        # keeps roiHash in sync with roiStore, either completely or only for the given indices
+        self.roisChanged = True
+        if indices is None:
+            self.roiHash.rebuild(self.roiStore.xy)
+            # ROIs were added or removed, the cursor has to be classified again at the same position
+            self.lastMove = None
+        else:
+            for idx in indices:
+                self.roiHash.update(idx, *self.roiStore.get(idx))
+
 
-def validate_video_path(path):
-    if get_path_components(path)[1] in [".mp4", ".MP4"]:
-        return True
+def run_ffmpeg_crops(ffmpeg_executable, input_path, outputs, info=None, report=None, encoder=SOFTWARE_ENCODER):
+    """
+    Renders all crops of one video in a single FFmpeg call. Executed by the worker threads of crop_video.
+    The input is decoded only once and split into one filter chain and output file per ROI.
+    report(fraction) is called with the share of the video that is done, based on the frame count
+    or, if unknown, the duration in info (see probe_video).
+    encoder is one of VIDEO_ENCODERS, hardware encoders also decode with hardware acceleration.
+    Outputs with filter None are copied without decoding and encoding (-c copy).
+    """
+    filters = [vf for _, vf in outputs if vf is not None]
+    labels = [f"[s{n}]" for n in range(len(filters))]
+    if len(filters) > 1:
+        graph = f"[0:v]split={len(filters)}{''.join(labels)};"
     else:
-        return False
+        labels = ["[0:v]"]
+        graph = ""
+    graph += ";".join(f"{label}{vf}[o{n}]" for n, (label, vf) in enumerate(zip(labels, filters)))
+
+    args = [
+        ffmpeg_executable, '-y',
+        '-nostdin',                         # do not poll the console for key presses
+        '-loglevel', 'error',
+        '-progress', 'pipe:1', '-nostats',
+        *([] if encoder == SOFTWARE_ENCODER or not filters else ['-hwaccel', 'auto']),
+        '-ss', '0',
+        '-threads', str(FFMPEG_THREADS),    # decoder
+        '-i', input_path,
+        *(['-filter_complex', graph, '-filter_complex_threads', '1'] if filters else [])
+    ]
+    n = 0
+    for output_path, vf in outputs:
+        if vf is None:
+            args += ['-map', '0:v', '-map', '0:a?', '-c', 'copy', output_path]
+            continue
+        args += [
+            '-map', f'[o{n}]',
+            '-map', '0:a?',
+            '-c:v', encoder,
+            *VIDEO_ENCODERS[encoder],
+            '-threads', str(FFMPEG_THREADS),
+            output_path
+        ]
+        n += 1
+
+    # -progress writes key=value lines to stdout, errors are collected from stderr by a second thread
+    process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               bufsize=PIPE_BUFFER_SIZE, text=True)
+    errors = []
+    stderr_reader = threading.Thread(target=lambda: errors.extend(process.stderr), daemon=True)
+    stderr_reader.start()
+
+    total_frames = info["frames"] if info else 0
+    total_us = info["duration"] * 1e6 if info else 0
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        if not report or not value.isdigit():
+            continue
+        if key == "frame" and total_frames:
+            report(min(int(value) / total_frames, 1.0))
+        elif key == "out_time_us" and total_us and not total_frames:
+            report(min(int(value) / total_us, 1.0))
+
+    stderr_reader.join()
+    if process.wait() != 0:
+        raise RuntimeError(f"FFmpeg failed for {input_path}:\n{''.join(errors)[-1000:]}")
+
+
+def ffmpeg_thread_count(outputs):
+    # threads of run_ffmpeg_crops for these outputs: the decoder and one encoder per cropped output
+    return FFMPEG_THREADS * (1 + sum(vf is not None for _, vf in outputs))
+
+
+def detect_encoders(ffmpeg_executable):
+    """
+    Returns the encoders of VIDEO_ENCODERS that work on this machine, in order of preference.
+    FFmpeg lists hardware encoders even without the matching hardware, so each one is tested
+    by encoding a single frame. SOFTWARE_ENCODER is always returned as the last option.
+    """
+    result = subprocess.run([ffmpeg_executable, '-hide_banner', '-encoders'], capture_output=True, text=True)
+    listed = {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+
+    encoders = []
+    for encoder, options in VIDEO_ENCODERS.items():
+        if encoder == SOFTWARE_ENCODER or encoder not in listed:
+            continue
+        test = subprocess.run([
+            ffmpeg_executable,
+            '-nostdin',
+            '-loglevel', 'error',
+            '-f', 'lavfi',
+            '-i', 'color=size=256x256',
+            '-frames:v', '1',
+            '-c:v', encoder,
+            *options,
+            '-f', 'null',
+            '-'
+        ], capture_output=True)
+        if test.returncode == 0:
+            encoders.append(encoder)
+    return encoders + [SOFTWARE_ENCODER]
+
+
+def extract_frame(ffmpeg_executable, path, seconds, width, height):
+    """
+    Decodes a single frame at the given time with FFmpeg and returns it as BGR array like OpenCV does.
+    Seeking before the input (-ss before -i) starts decoding at the closest keyframe.
+    """
+    result = subprocess.run([
+        ffmpeg_executable,
+        '-nostdin',
+        '-loglevel', 'error',
+        '-ss', str(seconds),
+        '-i', path,
+        '-frames:v', '1',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'bgr24',
+        '-'
+    ], capture_output=True, check=True, bufsize=PIPE_BUFFER_SIZE)
+    return np.frombuffer(result.stdout, dtype=np.uint8).reshape(height, width, 3)
+
+
+def probe_video(ffprobe_executable, path):
+    """
+    Reads width, height, number of frames and duration of the first video stream without decoding it.
+    Width and height are those of the displayed frame, i.e. swapped for videos rotated by 90 degrees.
+    """
+    stream = ffmpeg.probe(path, cmd=ffprobe_executable, select_streams='v:0')["streams"][0]
+    width, height = int(stream["width"]), int(stream["height"])
+    rotation = int(stream.get("tags", {}).get("rotate", 0))
+    for side_data in stream.get("side_data_list", []):
+        rotation = int(side_data.get("rotation", rotation))
+    if rotation % 180 == 90:
+        width, height = height, width
+    duration = float(stream.get("duration", 0))
+    if "nb_frames" in stream:
+        frames = int(stream["nb_frames"])
+    else:
+        num, den = stream.get("avg_frame_rate", "0/1").split("/")
+        frames = int(duration * int(num) / int(den)) if int(den) else 0
+    return {
+        "width": width,
+        "height": height,
+        "frames": frames,
+        "duration": duration
+    }
+
+
+def roi_dict_to_json(roi_dict):
+    """
+    Serializes the ROIs per video path as UTF-8 encoded JSON.
+    """
+    return json.dumps({
+        "format": SETTINGS_FORMAT,
+        "videos": [
+            {"path": path, "rois": [list(roi.bbox) for roi in rois]}
+            for path, rois in roi_dict.items()
+        ]
+    }).encode("utf-8")
+
+
+def roi_dict_from_json(data):
+    """
+    Reads settings written by roi_dict_to_json. Files without the JSON format header are
+    settings of older versions, which were pickled.
+    """
+    if not data.lstrip().startswith(b"{"):
+        return pickle.loads(data)
+    settings = json.loads(data)
+    if settings.get("format") != SETTINGS_FORMAT:
+        raise ValueError("The file does not contain videoCropROIs settings.")
+    return {
+        video["path"]: rois_from_array(np.array(video["rois"], dtype=np.int32).reshape(-1, 4))
+        for video in settings["videos"]
+    }
+
+
+def rois_to_array(rois):
+    # (N, 4) int32 array with the rows [x1, y1, x2, y2]
+    return np.array([roi.bbox for roi in rois], dtype=np.int32).reshape(-1, 4)
+
+
+def rois_from_array(xy):
+    """
+    Roi objects for the rows of rois_to_array. xy is copied once into a contiguous int32 block and
+    every Roi is a view on its row of that block, so the ROIs of a video lie next to each other in memory.
+    The corners of each row are sorted like in RoiStore.extendArray, so imported ROIs never have a negative size.
+    """
+    xy = np.asarray(xy, dtype=np.int32).reshape(-1, 4)
+    block = np.empty((len(xy), 2, 2), dtype=np.int32)
+    block[:, 0] = np.minimum(xy[:, :2], xy[:, 2:])
+    block[:, 1] = np.maximum(xy[:, :2], xy[:, 2:])
+    return [Roi.fromArray(coordinates) for coordinates in block]
+
+
+def save_roi_array(path, xy):
+    # ROIs of one video as .npy file of ROI_DTYPE records, the array is written as one block
+    records = np.ascontiguousarray(xy, dtype="<i4").reshape(-1, 4).view(ROI_DTYPE).ravel()
+    np.save(path, records, allow_pickle=False)
+
+
+def load_roi_array(path):
+    """
+    Reads ROIs written by save_roi_array as array of rois_to_array. The records are memory mapped
+    and copied once. .npz files (xy array) and .pkl files (pickled Roi lists) are from older versions.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pkl":
+        with open(path, 'rb') as file:
+            return rois_to_array(pickle.load(file))
+    if extension == ".npz":
+        with np.load(path) as data:
+            return data["xy"].astype(np.int32).reshape(-1, 4)
+    records = np.load(path, mmap_mode="r", allow_pickle=False)
+    if records.dtype != ROI_DTYPE:
+        raise ValueError("The file does not contain ROIs.")
+    return np.array(records.view("<i4").reshape(-1, 4), dtype=np.int32)
+
+
+def format_progress(percent, elapsed):
+    # e.g. "42 % - 1:23 remaining", the remaining time is extrapolated from the elapsed seconds
+    if percent <= 0:
+        return f"{percent:.0f} %"
+    remaining = int(elapsed * (100 - percent) / percent)
+    return f"{percent:.0f} % - {remaining // 60}:{remaining % 60:02d} remaining"
+
+
+def get_ffprobe_executable(ffmpeg_executable):
+    # ffprobe is shipped next to ffmpeg
+    directory, name = os.path.split(ffmpeg_executable)
+    return os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+
+
+def hit_test_rois(bounds, x, y):
+    """
+    Classifies the mouse position (x, y) relative to all ROIs at once.
+    bounds is an (N, 4) array of [x1, y1, x2, y2]. Returns for every ROI the index of the
+    first matching region in ROI_REGIONS (0 = no hit).
+    """
+    x1, y1, x2, y2 = bounds.T
+    r, r2 = HANDLE_RADIUS, HANDLE_CORNER_RADIUS
+    # every region lies within the bounds grown by the corner distance, most mouse moves hit none of them
+    near = ((np.minimum(x1, x2) - r2 <= x) & (x <= np.maximum(x1, x2) + r2)
+            & (np.minimum(y1, y2) - r2 <= y) & (y <= np.maximum(y1, y2) + r2))
+    if not np.any(near):
+        return np.zeros(len(bounds), dtype=np.intp)
+    nearX1, nearX2 = np.abs(x1 - x) <= r2, np.abs(x2 - x) <= r2
+    nearY1, nearY2 = np.abs(y1 - y) <= r2, np.abs(y2 - y) <= r2
+    alongX = (x1 - r <= x) & (x <= x2 + r)
+    alongY = (y1 - r <= y) & (y <= y2 + r)
+    return np.select([
+        nearX1 & nearY1,                                # top-left
+        nearX2 & nearY1,                                # top-right
+        nearX1 & nearY2,                                # bottom-left
+        nearX2 & nearY2,                                # bottom-right
+        alongX & (np.abs(y1 - y) <= r),                 # top
+        alongX & (np.abs(y2 - y) <= r),                 # bottom
+        (np.abs(x1 - x) <= r) & alongY,                 # left
+        (np.abs(x2 - x) <= r) & alongY,                 # right
+        (x1 <= x) & (x <= x2) & (y1 <= y) & (y <= y2)   # inside
+    ], range(1, len(ROI_REGIONS)), 0)
+
+
+def contains_point(bounds, x, y):
+    # mask of the ROIs in the (N, 4) array bounds that contain (x, y), edges included
+    return (bounds[:, 0] <= x) & (x <= bounds[:, 2]) & (bounds[:, 1] <= y) & (y <= bounds[:, 3])
+
+
+def classify_hover(bounds, x, y):
+    """
+    Returns (region, index) of the last ROI in bounds that contains (x, y) in one of its regions,
+    region is an index into ROI_REGIONS and ROI_CURSORS. Returns (0, -1) if no ROI is hit.
+    """
+    if len(bounds) == 0:
+        return 0, -1
+    regions = hit_test_rois(bounds, x, y)
+    hits = np.flatnonzero(regions)
+    if hits.size == 0:
+        return 0, -1
+    idx = int(hits[-1])
+    return int(regions[idx]), idx
+
+
+def validate_video_path(path):
+    # only MP4 videos are supported, the extension is compared case-insensitively
+    return isinstance(path, str) and path.lower().endswith(".mp4")
 
 
 def get_path_components(file_path):
@@ -1019,9 +1763,10 @@ def get_path_components(file_path):
 
 
 if __name__ == "__main__":
-    debug = True
+    logging.basicConfig(level=logging.WARNING)
     params = {
-        "ffmpeg_executable": r'ffmpeg.exe'
+        "ffmpeg_executable": r'ffmpeg.exe',
+        "ffprobe_executable": r'ffprobe.exe'
     }
     root = tk.Tk()
     app = VideoCropperGUI(root, params=params)